@@ -1,16 +1,111 @@
 import boto3
 from botocore.config import Config
-import re
+from botocore.exceptions import BotoCoreError, ClientError
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
+import functools
+import heapq
+import operator
+import threading
+import time
+
+from backend.cache import ttl_cache
+
+aws_cfg = Config(retries={'max_attempts': 4}, max_pool_connections=50)
+
+# ----------------------------------------------------
+# CIRCUIT BREAKER (one per region)
+# Opens after max_failures outage-type errors inside window
+# seconds; after reset_after seconds calls are let through
+# again and the first failure re-opens it
+# ----------------------------------------------------
+class CircuitOpenError(RuntimeError):
+    pass
+
+
+class CircuitBreaker:
+    def __init__(self, max_failures: int = 5, window: int = 60, reset_after: int = 30):
+        self.max_failures = max_failures
+        self.window = window
+        self.reset_after = reset_after
+        self._failures = deque()
+        self._opened_at = None
+        self._lock = threading.Lock()
+
+    def before_call(self):
+        with self._lock:
+            if self._opened_at and time.monotonic() - self._opened_at < self.reset_after:
+                raise CircuitOpenError("EC2 circuit open, skipping call")
+
+    def record_success(self):
+        with self._lock:
+            self._failures.clear()
+            self._opened_at = None
+
+    def record_failure(self):
+        now = time.monotonic()
+        with self._lock:
+            self._failures.append(now)
+            while self._failures and now - self._failures[0] > self.window:
+                self._failures.popleft()
+            # a failure while half-open re-opens straight away
+            if self._opened_at or len(self._failures) >= self.max_failures:
+                self._opened_at = now
+
+
+def _is_outage(e: Exception) -> bool:
+    # Bad input (unknown AMI / instance type) must not trip the breaker
+    if isinstance(e, ClientError):
+        code = e.response.get("Error", {}).get("Code", "")
+        status = e.response.get("ResponseMetadata", {}).get("HTTPStatusCode", 500)
+        return status >= 500 or "Throttl" in code
+    return isinstance(e, BotoCoreError)
+
+
+# ----------------------------------------------------
+# SHARED EC2 CLIENTS (one per region)
+# Session.client() is not thread-safe, so creation is locked
+# ----------------------------------------------------
+_SESSION = boto3.session.Session()
+_CLIENT_LOCK = threading.Lock()
+_BREAKERS = {}
+_MAX_BREAKERS = 64  # regions come from query strings
+
+
+@functools.lru_cache(maxsize=64)
+def _ec2(region=None):
+    with _CLIENT_LOCK:
+        return _SESSION.client("ec2", region_name=region, config=aws_cfg)
+
+
+@contextmanager
+def _ec2_call(region=None):
+    with _CLIENT_LOCK:
+        breaker = _BREAKERS.get(region)
+        if breaker is None:
+            if len(_BREAKERS) >= _MAX_BREAKERS:
+                del _BREAKERS[next(iter(_BREAKERS))]
+            breaker = _BREAKERS[region] = CircuitBreaker()
+    breaker.before_call()
+    try:
+        yield _ec2(region)
+    except Exception as e:
+        if _is_outage(e):
+            breaker.record_failure()
+        raise
+    breaker.record_success()
 
-aws_cfg = Config(retries={'max_attempts': 4})
 
 # ----------------------------------------------------
 # LIST REGIONS
 # ----------------------------------------------------
+@ttl_cache(ttl=900)
 def list_regions():
-    ec2 = boto3.client("ec2", config=aws_cfg)
     try:
-        return [r["RegionName"] for r in ec2.describe_regions()["Regions"]]
+        with _ec2_call() as ec2:
+            return [r["RegionName"] for r in ec2.describe_regions()["Regions"]]
     except Exception as e:
         print("Regions error:", e)
         return []
@@ -19,43 +114,93 @@ def list_regions():
 # ----------------------------------------------------
 # LIST INSTANCE TYPES
 # ----------------------------------------------------
-def list_instance_types(region: str):
-    ec2 = boto3.client("ec2", region_name=region, config=aws_cfg)
+def _family(inst_type: str):
+    # Leading lowercase letters ("m6i.large" -> "m"); whole string if none
+    for i, c in enumerate(inst_type):
+        if not "a" <= c <= "z":
+            return inst_type[:i] or inst_type
+    return inst_type
+
+
+# Raw DescribeInstanceTypes payloads kept by list_instance_types so that
+# get_instance_info can answer without another EC2 round-trip
+_TYPE_INFO = {}
+
+
+# NextToken pages can only be fetched one after another, so the listing
+# is split by leading letter instead and the shards are paged in parallel.
+# Together the shards must cover a-z.
+_TYPE_SHARDS = [
+    ["a*", "b*"],
+    ["c*"],
+    ["d*", "e*", "f*", "g*"],
+    ["h*", "i*", "j*", "k*", "l*"],
+    ["m*"],
+    ["n*", "o*", "p*", "q*"],
+    ["r*"],
+    ["s*", "t*", "u*", "v*", "w*", "x*", "y*", "z*"],
+]
+
+
+def _list_type_shard(ec2, patterns):
     paginator = ec2.get_paginator("describe_instance_types")
+    pages = paginator.paginate(
+        Filters=[{"Name": "instance-type", "Values": patterns}],
+        PaginationConfig={"PageSize": 100},
+    )
+    return [it for page in pages for it in page["InstanceTypes"]]
+
+
+@ttl_cache(ttl=900)
+def list_instance_types(region: str):
     items = []
 
     try:
-        for page in paginator.paginate():
-            for it in page["InstanceTypes"]:
-                items.append({
-                    "type": it["InstanceType"],
-                    "arch": it.get("ProcessorInfo", {}).get("SupportedArchitectures", ["x86_64"])
-                })
+        with _ec2_call(region) as ec2, ThreadPoolExecutor(max_workers=len(_TYPE_SHARDS)) as pool:
+            for shard in pool.map(lambda p: _list_type_shard(ec2, p), _TYPE_SHARDS):
+                for it in shard:
+                    inst_type = it["InstanceType"]
+                    _TYPE_INFO[(region, inst_type)] = it
+                    items.append((
+                        _family(inst_type),
+                        inst_type,
+                        it.get("ProcessorInfo", {}).get("SupportedArchitectures", ["x86_64"]),
+                    ))
     except Exception as e:
         print("Instance types error:", e)
         return []
 
-    def family(inst_type: str):
-        match = re.match(r"([a-z]+)", inst_type)
-        return match.group(1) if match else inst_type
+    # Families alphabetically, types alphabetically within each family
+    items.sort(key=operator.itemgetter(0, 1))
+    return [{"type": inst_type, "arch": arch} for _, inst_type, arch in items]
+
 
-    grouped = {}
-    for item in items:
-        grouped.setdefault(family(item["type"]), []).append(item)
+AMI_LIMIT = 50  # more than enough
+AMI_MAX_AGE_DAYS = 90  # EKS publishes new AMIs weekly
 
-    ordered = []
-    for fam in sorted(grouped.keys()):
-        ordered.extend(sorted(grouped[fam], key=lambda x: x["type"]))
-    return ordered
+
+def _recent_month_patterns(days: int):
+    # creation-date only supports wildcards, so the window is
+    # expressed as one "YYYY-MM-*" pattern per month it touches
+    now = datetime.now(timezone.utc)
+    month = (now - timedelta(days=days)).replace(day=1)
+    patterns = []
+    while month <= now:
+        patterns.append(month.strftime("%Y-%m-*"))
+        month = (month + timedelta(days=32)).replace(day=1)
+    return patterns
+
+# Name + description of every AMI list_amis has returned, so that
+# detect_os_family can skip DescribeImages for them
+_AMI_TEXT = {}
 
 
 # ----------------------------------------------------
 # LIST AMIs — EKS OPTIMIZED **ONLY**
 # Ensures eksctl NEVER asks for bootstrap scripts
 # ----------------------------------------------------
+@ttl_cache(ttl=900)
 def list_amis(region: str, arch: str):
-    ec2 = boto3.client("ec2", region_name=region, config=aws_cfg)
-
     filters = [
         {"Name": "architecture", "Values": [arch]},
         {
@@ -66,21 +211,31 @@ def list_amis(region: str, arch: str):
             ]
         },
         {"Name": "state", "Values": ["available"]},
+        # Let EC2 drop legacy AMIs instead of parsing them here
+        {"Name": "creation-date", "Values": _recent_month_patterns(AMI_MAX_AGE_DAYS)},
     ]
 
     OWNERS = ["amazon"]  # AWS owns EKS AMIs
 
+    # DescribeImages returns no particular order, so every page is still
+    # read — but only the newest AMI_LIMIT are ever held in memory
     try:
-        resp = ec2.describe_images(Owners=OWNERS, Filters=filters)
+        with _ec2_call(region) as ec2:
+            pages = ec2.get_paginator("describe_images").paginate(
+                Owners=OWNERS, Filters=filters, PaginationConfig={"PageSize": 1000}
+            )
+            images = heapq.nlargest(
+                AMI_LIMIT,
+                (img for page in pages for img in page["Images"]),
+                key=lambda x: x["CreationDate"],
+            )
     except Exception as e:
         print("AMI error:", e)
         return []
 
-    # Sort latest - keep top results only
-    images = sorted(resp["Images"], key=lambda x: x["CreationDate"], reverse=True)
-
     final = []
-    for img in images[:50]:  # more than enough
+    for img in images:  # latest first
+        _AMI_TEXT[(region, img["ImageId"])] = img.get("Name", "") + " " + img.get("Description", "")
         final.append({
             "image_id": img["ImageId"],
             "name": img.get("Name", ""),
@@ -94,13 +249,16 @@ def list_amis(region: str, arch: str):
 # ----------------------------------------------------
 # INSTANCE INFO
 # ----------------------------------------------------
+@ttl_cache(ttl=900)
 def get_instance_info(region: str, instance_type: str):
-    ec2 = boto3.client("ec2", region_name=region, config=aws_cfg)
-    try:
-        it = ec2.describe_instance_types(InstanceTypes=[instance_type])["InstanceTypes"][0]
-    except Exception as e:
-        print("Instance info error:", e)
-        return None
+    it = _TYPE_INFO.get((region, instance_type))
+    if it is None:
+        try:
+            with _ec2_call(region) as ec2:
+                it = ec2.describe_instance_types(InstanceTypes=[instance_type])["InstanceTypes"][0]
+        except Exception as e:
+            print("Instance info error:", e)
+            return None
 
     mem_mib = it["MemoryInfo"]["SizeInMiB"]
     arch = it.get("ProcessorInfo", {}).get("SupportedArchitectures", ["x86_64"])
@@ -116,17 +274,46 @@ def get_instance_info(region: str, instance_type: str):
 # ----------------------------------------------------
 # OS FAMILY DETECTION — eksctl SAFE
 # ----------------------------------------------------
-def detect_os_family(region: str, ami_id: str):
-    ec2 = boto3.client("ec2", region_name=region, config=aws_cfg)
-    try:
-        img = ec2.describe_images(ImageIds=[ami_id])["Images"][0]
-    except Exception:
-        return "Unknown"
+# AMI ids are immutable, so a resolved family never expires. Errors
+# (e.g. InvalidAMIID.*) raise and are remembered for NEG_TTL, so a bad
+# id does not reach DescribeImages on every request.
+@ttl_cache(ttl=None, maxsize=4096)
+def _ami_family(region: str, ami_id: str):
+    text = _AMI_TEXT.get((region, ami_id))
+    if text is None:
+        with _ec2_call(region) as ec2:
+            img = ec2.describe_images(ImageIds=[ami_id])["Images"][0]
+        text = img.get("Name", "") + " " + img.get("Description", "")
 
-    text = (img.get("Name", "") + " " + img.get("Description", "")).lower()
+    text = text.lower()
 
     # All EKS worker AMIs are Amazon Linux 2023 (from 2024+ releases)
     if "amazon-eks-node" in text or "amazon linux 2023" in text or "al2023" in text:
         return "AmazonLinux2023"
 
     return "Unknown"
+
+
+def detect_os_family(region: str, ami_id: str):
+    try:
+        return _ami_family(region, ami_id)
+    except Exception:
+        return "Unknown"
+
+
+# Async twin for the API: cache hits are answered on the event loop
+async def detect_os_family_aio(region: str, ami_id: str):
+    try:
+        return await _ami_family.aio(region, ami_id)
+    except Exception:
+        return "Unknown"
+
+
+# ----------------------------------------------------
+# CACHE CONTROL
+# EC2 lookups only; other modules' caches are left alone
+# ----------------------------------------------------
+def clear_cache():
+    for fn in (list_regions, list_instance_types, list_amis, get_instance_info):
+        fn.cache_clear()
+    _ami_family.cache_clear()
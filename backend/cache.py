@@ -0,0 +1,102 @@
+# backend/cache.py
+
+import asyncio
+import functools
+import math
+import threading
+import time
+from typing import Optional
+
+NEG_TTL = 30  # seconds a failed lookup is remembered
+
+# ----------------------------------------------------
+# TTL CACHE
+# Empty / None results (the callers' error fallbacks) and
+# raised exceptions are kept only for neg_ttl seconds.
+# Keys come from request parameters, so each cache holds at
+# most maxsize entries: expired ones are swept when it fills,
+# then the oldest write is dropped. ttl=None never expires
+# successful results (exceptions still use neg_ttl)
+# ----------------------------------------------------
+def ttl_cache(ttl: Optional[int] = 900, neg_ttl: int = NEG_TTL, maxsize: int = 1024):
+    def decorator(fn):
+        cache = {}
+        lock = threading.Lock()
+
+        def _lookup(key):
+            with lock:
+                hit = cache.get(key)
+            if hit and hit[0] > time.monotonic():
+                return hit
+            return None
+
+        def _put(key, entry):
+            with lock:
+                cache.pop(key, None)
+                if len(cache) >= maxsize:
+                    now = time.monotonic()
+                    for k in [k for k, v in cache.items() if v[0] <= now]:
+                        del cache[k]
+                    if len(cache) >= maxsize:
+                        del cache[next(iter(cache))]
+                cache[key] = entry
+
+        def _unwrap(hit):
+            if isinstance(hit[1], Exception):
+                # drop the previous raise's frames so hits don't pile them up
+                raise hit[1].with_traceback(None)
+            return hit[1]
+
+        def _has_good(key):
+            hit = _lookup(key)
+            return bool(hit) and not isinstance(hit[1], Exception) and bool(hit[1])
+
+        # keep_good: a failed reload leaves an unexpired good entry in place
+        def _load(key, keep_good=False):
+            try:
+                value = fn(*key)
+            except Exception as e:
+                if not (keep_good and _has_good(key)):
+                    _put(key, (time.monotonic() + neg_ttl, e))
+                raise
+            if not value:
+                if keep_good and _has_good(key):
+                    return value
+                expires = time.monotonic() + neg_ttl
+            elif ttl is None:
+                expires = math.inf
+            else:
+                expires = time.monotonic() + ttl
+            _put(key, (expires, value))
+            return value
+
+        @functools.wraps(fn)
+        def wrapper(*args):
+            hit = _lookup(args)
+            if hit:
+                return _unwrap(hit)
+            return _load(args)
+
+        # Background reloads serve stale-on-error: the caller sees the
+        # failed result (to schedule a retry), readers keep the old one
+        def refresh(*args):
+            return _load(args, keep_good=True)
+
+        # For async callers: hits are answered on the event loop,
+        # only misses pay for a worker thread
+        async def aio(*args):
+            hit = _lookup(args)
+            if hit:
+                return _unwrap(hit)
+            return await asyncio.to_thread(wrapper, *args)
+
+        def cache_clear():
+            with lock:
+                cache.clear()
+
+        wrapper.refresh = refresh
+        wrapper.aio = aio
+        wrapper.cache_clear = cache_clear
+        return wrapper
+
+    return decorator
@@ -3,20 +3,77 @@
 import os
 import subprocess
 import shlex
+import threading
 import time
+import uuid
 import logging
 from pathlib import Path
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, Optional
 import jinja2
+from kubernetes import client as k8s_client, config as k8s_config
+from kubernetes.client.rest import ApiException
+from kubernetes.stream import stream
+
+from backend.cache import ttl_cache
 
 LOG = logging.getLogger("eks_jmeter_manager")
 logging.basicConfig(level=logging.INFO)
 
+EXEC_TIMEOUT_SEC = 30  # per exec session (status polls, triggers, ls)
+
 
 # ============================================================
-#                KUBECTL HELPERS
+#                KUBERNETES HELPERS
 # ============================================================
 class KubeHelper:
+    # --------------------------------------------------------
+    # In-process API client (kubeconfig written by eksctl).
+    # Loaded lazily because the cluster may not exist yet, and
+    # reset after eksctl rewrites the kubeconfig.
+    # --------------------------------------------------------
+    _api_lock = threading.Lock()
+    _exec_lock = threading.Lock()
+    _core_v1: Optional[k8s_client.CoreV1Api] = None
+    _exec_v1: Optional[k8s_client.CoreV1Api] = None
+
+    @classmethod
+    def _load_clients(cls):
+        # Returns (core, exec) read under the lock, so a concurrent
+        # reset_clients() cannot hand a caller None
+        with cls._api_lock:
+            if cls._core_v1 is None:
+                k8s_config.load_kube_config()
+                cls._core_v1 = k8s_client.CoreV1Api()
+                # stream() swaps its ApiClient's request method while it runs,
+                # so exec gets a client of its own
+                cls._exec_v1 = k8s_client.CoreV1Api(k8s_client.ApiClient())
+            return cls._core_v1, cls._exec_v1
+
+    @classmethod
+    def core_v1(cls) -> k8s_client.CoreV1Api:
+        return cls._load_clients()[0]
+
+    @classmethod
+    def reset_clients(cls):
+        with cls._api_lock:
+            cls._core_v1 = None
+            cls._exec_v1 = None
+
+    @staticmethod
+    def api_ready() -> bool:
+        try:
+            KubeHelper.core_v1().api_client.call_api(
+                "/readyz", "GET",
+                auth_settings=["BearerToken"],
+                response_type="str",
+                _return_http_data_only=True,
+                # (connect, read) — a stalled endpoint must not hang the wait loop
+                _request_timeout=(3, 5),
+            )
+            return True
+        except Exception:
+            return False
+
     @staticmethod
     def apply_manifest(yaml_text: str, namespace: Optional[str] = None):
         cmd = ["kubectl", "apply", "-f", "-"]
@@ -25,69 +82,116 @@ class KubeHelper:
             cmd.insert(3, namespace)
 
         LOG.info("Applying manifest (namespace=%s)...", namespace)
-        p = subprocess.Popen(
-            cmd,
-            stdin=subprocess.PIPE,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-        )
-        out, err = p.communicate(input=yaml_text.encode())
+        res = subprocess.run(cmd, input=yaml_text, text=True, capture_output=True)
 
-        if p.returncode != 0:
-            msg = err.decode().strip()
+        if res.returncode != 0:
+            msg = res.stderr.strip()
             LOG.error("kubectl apply FAILED: %s", msg)
             raise RuntimeError(msg)
 
-        LOG.info(out.decode().strip())
+        LOG.info(res.stdout.strip())
 
     @staticmethod
     def ensure_namespace(ns: str):
+        api = KubeHelper.core_v1()
         try:
-            subprocess.check_call(
-                ["kubectl", "get", "ns", ns],
-                stdout=subprocess.DEVNULL,
-                stderr=subprocess.DEVNULL,
-            )
+            api.read_namespace(ns)
             LOG.info("Namespace '%s' already exists.", ns)
-        except subprocess.CalledProcessError:
+        except ApiException as e:
+            if e.status != 404:
+                raise
             LOG.info("Creating namespace '%s' ...", ns)
-            subprocess.check_call(["kubectl", "create", "ns", ns])
+            api.create_namespace(
+                k8s_client.V1Namespace(metadata=k8s_client.V1ObjectMeta(name=ns))
+            )
 
+    # Polled by /test/status every second — cache for 10s (2s when missing)
     @staticmethod
+    @ttl_cache(ttl=10, neg_ttl=2)
     def get_pod_name(namespace: str, selector: str) -> Optional[str]:
-        cmd = [
-            "kubectl", "get", "pods", "-n", namespace,
-            "-l", selector, "-o", "jsonpath={.items[0].metadata.name}"
-        ]
         try:
-            out = subprocess.check_output(
-                cmd, stderr=subprocess.STDOUT
-            ).decode().strip()
-            return out or None
-        except subprocess.CalledProcessError:
+            pods = KubeHelper.core_v1().list_namespaced_pod(
+                namespace, label_selector=selector, limit=1
+            )
+        except Exception as e:
+            LOG.warning("Pod lookup failed (%s): %s", selector, e)
             return None
+        return pods.items[0].metadata.name if pods.items else None
 
     @staticmethod
     def exec_in_pod(namespace: str, pod: str, command: str, container: Optional[str] = None):
-        cmd = ["kubectl", "exec", "-n", namespace, pod]
-        if container:
-            cmd += ["-c", container]
-        cmd += ["--", "sh", "-c", command]
+        kwargs = {"container": container} if container else {}
 
-        p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-        out, err = p.communicate()
-        return p.returncode, out.decode(), err.decode()
+        # Failures and hung sessions come back as a non-zero rc,
+        # like `kubectl exec` did
+        try:
+            _, exec_v1 = KubeHelper._load_clients()
+            # stream() swaps the client's request method only while it
+            # opens the websocket, so just that call is serialized
+            with KubeHelper._exec_lock:
+                resp = stream(
+                    exec_v1.connect_get_namespaced_pod_exec,
+                    pod,
+                    namespace,
+                    command=["sh", "-c", command],
+                    stderr=True,
+                    stdin=False,
+                    stdout=True,
+                    tty=False,
+                    _preload_content=False,
+                    _request_timeout=EXEC_TIMEOUT_SEC,
+                    **kwargs,
+                )
+        except Exception as e:
+            return 1, "", str(e)
+
+        try:
+            resp.run_forever(timeout=EXEC_TIMEOUT_SEC)
+            if resp.is_open():
+                return 1, "", f"exec timed out after {EXEC_TIMEOUT_SEC}s"
+            rc = resp.returncode
+            return (1 if rc is None else rc), resp.read_stdout(), resp.read_stderr()
+        except Exception as e:
+            return 1, "", str(e)
+        finally:
+            resp.close()
 
     @staticmethod
-    def copy_from_pod(namespace: str, pod: str, remote_path: str, local_path: str):
-        cmd = ["kubectl", "cp", f"{namespace}/{pod}:{remote_path}", local_path]
+    def copy_gzip_from_pod(namespace: str, pod: str, remote_path: str, local_path: str):
+        # JTLs are plain text: gzip in the pod and stream the compressed
+        # bytes straight to disk instead of an uncompressed `kubectl cp`
+        cmd = [
+            "kubectl", "exec", "-n", namespace, pod, "--",
+            "gzip", "-c", remote_path,
+        ]
         LOG.info("Copying results: %s", " ".join(cmd))
-        subprocess.check_call(cmd)
+        with open(local_path, "wb") as f:
+            res = subprocess.run(cmd, stdout=f, stderr=subprocess.PIPE)
+
+        if res.returncode != 0:
+            os.remove(local_path)
+            msg = res.stderr.decode(errors="replace").strip()
+            LOG.error("Result copy FAILED: %s", msg)
+            raise RuntimeError(msg)
 
 
 # ============================================================
 #                MAIN MANAGER
 # ============================================================
+# Applied in this order by apply_jmeter_manifests
+TEMPLATE_FILES = [
+    "storageclass-and-pvcs.yaml",
+    "jmeter-configmap.yaml.j2",
+    "jmeter-master-deployment.yaml.j2",
+    "jmeter-master-service.yaml.j2",
+    "jmeter-slaves-statefulset.yaml.j2",
+    "jmeter-slaves-service.yaml.j2",
+    "jmeter-slaves-hpa.yaml.j2",
+    "monitor-influx.yaml.j2",
+    "monitor-grafana.yaml.j2",
+]
+
+
 class EKSJMeterManager:
     def __init__(
         self,
@@ -106,10 +210,21 @@ class EKSJMeterManager:
             loader=jinja2.FileSystemLoader(str(self.templates_dir)),
             autoescape=False,
             keep_trailing_newline=True,
+            # Compiled templates survive restarts; sources are not re-checked
+            bytecode_cache=jinja2.FileSystemBytecodeCache(),
+            auto_reload=False,
         )
+        self._templates = {
+            f: self.jinja_env.get_template(f)
+            for f in TEMPLATE_FILES
+            if (self.templates_dir / f).exists()
+        }
 
         self.kube = KubeHelper()
 
+        self._create_job: Optional[Dict[str, Any]] = None
+        self._create_lock = threading.Lock()
+
     # --------------------------------------------------------
     @staticmethod
     def _is_cluster_scoped_template(name: str) -> bool:
@@ -125,19 +240,16 @@ class EKSJMeterManager:
     # ============================================================
     def _wait_for_kube_ready(self, timeout: int = 300):
         start = time.time()
+        delay = 0.5
         while True:
-            try:
-                subprocess.check_call(
-                    ["kubectl", "get", "nodes"],
-                    stdout=subprocess.DEVNULL,
-                    stderr=subprocess.DEVNULL,
-                )
+            if self.kube.api_ready():
                 LOG.info("Cluster API is ready.")
                 return
-            except subprocess.CalledProcessError:
-                if time.time() - start > timeout:
-                    raise TimeoutError("Timeout waiting for EKS cluster to be ready")
-                time.sleep(5)
+            remaining = timeout - (time.time() - start)
+            if remaining <= 0:
+                raise TimeoutError("Timeout waiting for EKS cluster to be ready")
+            time.sleep(min(delay, remaining))
+            delay = min(delay * 2, 30)
 
     def create_cluster(
         self,
@@ -149,6 +261,7 @@ class EKSJMeterManager:
         nodegroup_name: str = "jmeter-nodes",
         min_nodes: int = 1,
         max_nodes: int = 3,
+        on_output: Optional[Callable[[str], None]] = None,
     ):
         cmd = [
             "eksctl", "create", "cluster",
@@ -167,34 +280,98 @@ class EKSJMeterManager:
             LOG.info("Using custom AMI: %s (%s)", ami, ami_family)
 
         LOG.info("Executing eksctl:\n%s", " ".join(shlex.quote(x) for x in cmd))
-        subprocess.check_call(cmd)
+        # Stream eksctl's log lines as they come so callers can show progress
+        with subprocess.Popen(
+            cmd,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.STDOUT,
+            text=True,
+            encoding="utf-8",
+            errors="replace",
+        ) as p:
+            for line in p.stdout:
+                line = line.rstrip()
+                LOG.info("eksctl: %s", line)
+                if on_output:
+                    on_output(line)
+
+        if p.returncode != 0:
+            raise subprocess.CalledProcessError(p.returncode, cmd)
+        self.kube.reset_clients()
 
         self._wait_for_kube_ready()
+        self.kube.get_pod_name.cache_clear()
         self.kube.ensure_namespace(self.jmeter_namespace)
         self.kube.ensure_namespace(self.monitoring_namespace)
 
+    # --------------------------------------------------------
+    # Background creation job: eksctl takes 15-20 minutes, so the
+    # API starts it here and the UI polls get_cluster_creation_status
+    # --------------------------------------------------------
+    def start_cluster_creation(
+        self, *, region: str, node_type: str, context: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        with self._create_lock:
+            if self._create_job and self._create_job["status"] in ("PENDING", "RUNNING"):
+                raise RuntimeError("Cluster creation already in progress")
+            job = {
+                "job_id": uuid.uuid4().hex,
+                "status": "PENDING",
+                "returncode": None,
+                "progress": "",
+                "error": None,
+            }
+            self._create_job = job
+
+        threading.Thread(
+            target=self._run_create_job,
+            args=(job, region, node_type, context),
+            name=f"eks-create-{job['job_id'][:8]}",
+            daemon=True,
+        ).start()
+        return dict(job)
+
+    def _run_create_job(
+        self, job: Dict[str, Any], region: str, node_type: str, context: Dict[str, Any]
+    ):
+        job["status"] = "RUNNING"
+        try:
+            self.create_cluster(
+                region=region,
+                node_type=node_type,
+                on_output=lambda line: job.update(progress=line),
+            )
+            job["returncode"] = 0
+            job["progress"] = "Applying JMeter manifests"
+            self.apply_jmeter_manifests(context)
+            job["progress"] = "Cluster ready"
+            job["status"] = "SUCCEEDED"
+        except Exception as e:
+            LOG.exception("Cluster creation failed")
+            if isinstance(e, subprocess.CalledProcessError):
+                job["returncode"] = e.returncode
+            job["error"] = str(e)
+            job["status"] = "FAILED"
+
+    def get_cluster_creation_status(self) -> Dict[str, Any]:
+        if self._create_job is None:
+            return {"job_id": None, "status": "NONE"}
+        return dict(self._create_job)
+
     # ============================================================
     # MANIFESTS
     # ============================================================
     def render_template(self, name: str, context: Dict[str, Any]) -> str:
-        return self.jinja_env.get_template(name).render(**context)
+        tpl = self._templates.get(name) or self.jinja_env.get_template(name)
+        return tpl.render(**context)
 
     def apply_jmeter_manifests(self, context: Dict[str, Any]):
-        files = [
-            "storageclass-and-pvcs.yaml",
-            "jmeter-configmap.yaml.j2",
-            "jmeter-master-deployment.yaml.j2",
-            "jmeter-master-service.yaml.j2",
-            "jmeter-slaves-statefulset.yaml.j2",
-            "jmeter-slaves-service.yaml.j2",
-            "jmeter-slaves-hpa.yaml.j2",
-            "monitor-influx.yaml.j2",
-            "monitor-grafana.yaml.j2",
-        ]
+        # One multi-document `kubectl apply` per namespace; buckets keep
+        # the first-seen order of TEMPLATE_FILES
+        buckets: Dict[Optional[str], list] = {}
 
-        for f in files:
-            tpl = self.templates_dir / f
-            if not tpl.exists():
+        for f in TEMPLATE_FILES:
+            if f not in self._templates:
                 LOG.warning("Skipping missing template: %s", f)
                 continue
 
@@ -207,7 +384,10 @@ class EKSJMeterManager:
             else:
                 ns = self.jmeter_namespace
 
-            self.kube.apply_manifest(yaml_text, namespace=ns)
+            buckets.setdefault(ns, []).append(yaml_text)
+
+        for ns, docs in buckets.items():
+            self.kube.apply_manifest("\n---\n".join(docs), namespace=ns)
 
     # ============================================================
     # SLAVES MGMT
@@ -227,21 +407,24 @@ class EKSJMeterManager:
         )
 
     def wait_for_slaves(self, replicas: int, timeout_sec: int = 300):
-        for i in range(replicas):
-            pod = f"jmeter-slaves-{i}"
-            LOG.info("Waiting for slave pod %s to be Ready...", pod)
-            subprocess.check_call(
-                [
-                    "kubectl",
-                    "wait",
-                    "--for=condition=Ready",
-                    f"pod/{pod}",
-                    "-n",
-                    self.jmeter_namespace,
-                    f"--timeout={timeout_sec}s",
-                ]
-            )
-            LOG.info("Pod %s Ready.", pod)
+        if replicas <= 0:
+            return
+
+        # The StatefulSet is OrderedReady: pod N+1 only exists once pod N is
+        # Ready, so wait on the set itself rather than on named pods
+        LOG.info("Waiting for %s slave pod(s) to be Ready...", replicas)
+        subprocess.check_call(
+            [
+                "kubectl",
+                "rollout",
+                "status",
+                "statefulset/jmeter-slaves",
+                "-n",
+                self.jmeter_namespace,
+                f"--timeout={timeout_sec}s",
+            ]
+        )
+        LOG.info("All %s slave pod(s) Ready.", replicas)
 
     # ============================================================
     # 🚀 RUN DISTRIBUTED TEST  (FIXED)
@@ -267,6 +450,7 @@ class EKSJMeterManager:
         self.scale_slaves(max_shards)
         self.wait_for_slaves(max_shards)
 
+        self.kube.get_pod_name.cache_clear()
         pod = self.kube.get_pod_name(self.jmeter_namespace, "app=jmeter-master")
         if not pod:
             raise RuntimeError("JMeter master pod NOT found")
@@ -275,20 +459,11 @@ class EKSJMeterManager:
         container = "jmeter-master"
         LOG.info("Master container: %s", container)
 
-        rc, out, err = self.kube.exec_in_pod(
-            self.jmeter_namespace, pod,
-            "ls -1 /testplans/*.jmx 2>/dev/null | head -n 1",
-            container=container,
-        )
-
-        detected = out.strip()
-        if detected:
-            LOG.info("Using testplan: %s", detected)
-        else:
-            LOG.warning("Fallback testplan: %s", jmx_path)
-
+        # Detect the testplan and fire the trigger in a single exec session
         trigger_cmd = (
-            "echo RUNNING > /tmp/test_status && rm -f /tmp/run_test && touch /tmp/run_test"
+            "P=$(ls -1 /testplans/*.jmx 2>/dev/null | head -n 1); "
+            "echo RUNNING > /tmp/test_status && rm -f /tmp/run_test && touch /tmp/run_test "
+            "&& echo \"$P\""
         )
         LOG.info("Triggering entrypoint in master via: %s", trigger_cmd)
 
@@ -300,6 +475,12 @@ class EKSJMeterManager:
             LOG.error("Failed to trigger /tmp/run_test (rc=%s, stderr=%s)", rc, err)
             raise RuntimeError(f"Failed to trigger JMeter in master: {err}")
 
+        detected = out.strip()
+        if detected:
+            LOG.info("Using testplan: %s", detected)
+        else:
+            LOG.warning("Fallback testplan: %s", jmx_path)
+
         LOG.info("Backend trigger created and status set to RUNNING.")
         time.sleep(3)
 
@@ -349,10 +530,10 @@ class EKSJMeterManager:
             raise RuntimeError("No JTL generated on master")
 
         jtl_name = os.path.basename(remote)
-        local_path = os.path.join(local_dir, jtl_name)
-        self.kube.copy_from_pod(self.jmeter_namespace, pod, remote, local_path)
+        local_path = os.path.join(local_dir, jtl_name + ".gz")
+        self.kube.copy_gzip_from_pod(self.jmeter_namespace, pod, remote, local_path)
 
-        LOG.info("Downloaded JTL → %s", local_path)
+        LOG.info("Downloaded JTL (gzip) → %s", local_path)
         return local_path
 
     # ============================================================
@@ -360,6 +541,7 @@ class EKSJMeterManager:
     # ============================================================
     def delete_cluster(self):
         LOG.info("Deleting EKS cluster: %s", self.cluster_name)
+        self.kube.get_pod_name.cache_clear()
         try:
             subprocess.check_call(
                 ["eksctl", "delete", "cluster", "--name", self.cluster_name, "--force"]
@@ -2,8 +2,10 @@
 
 from fastapi import FastAPI, Query, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import HTMLResponse, FileResponse
+from fastapi.responses import HTMLResponse, FileResponse, ORJSONResponse
 from fastapi.staticfiles import StaticFiles
+import asyncio
+from contextlib import asynccontextmanager
 import subprocess
 import os
 import logging
@@ -13,7 +15,7 @@ from backend.aws_utils import (
     list_instance_types,
     list_amis,
     get_instance_info,
-    detect_os_family,
+    detect_os_family_aio,
 )
 
 from backend.eks_jmeter_manager import get_default_manager
@@ -21,7 +23,34 @@ from backend.eks_jmeter_manager import get_default_manager
 LOG = logging.getLogger("backend")
 logging.basicConfig(level=logging.INFO)
 
-app = FastAPI(title="JMeter EKS Platform")
+# ============================================================
+# BACKGROUND CACHE REFRESH
+# Keeps the regions cache warm so the UI never hits a cold miss:
+# refreshed well inside its 900s TTL, retried soon after a failure
+# ============================================================
+REGION_REFRESH_SEC = 720
+REGION_RETRY_SEC = 30
+
+async def _refresh_regions_forever():
+    while True:
+        regions = []
+        try:
+            regions = await asyncio.to_thread(list_regions.refresh)
+        except Exception:
+            LOG.exception("Region cache refresh failed")
+        await asyncio.sleep(REGION_REFRESH_SEC if regions else REGION_RETRY_SEC)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    refresher = asyncio.create_task(_refresh_regions_forever())
+    yield
+    refresher.cancel()
+
+app = FastAPI(
+    title="JMeter EKS Platform",
+    default_response_class=ORJSONResponse,
+    lifespan=lifespan,
+)
 
 # ============================================================
 # CORS CONFIG
@@ -39,17 +68,16 @@ app.add_middleware(
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
 FRONTEND_PATH = os.path.join(PROJECT_ROOT, "frontend")
 STATIC_PATH = os.path.join(FRONTEND_PATH, "static")
+INDEX_PATH = os.path.join(FRONTEND_PATH, "index.html")
 
 if os.path.isdir(STATIC_PATH):
     app.mount("/static", StaticFiles(directory=STATIC_PATH), name="static")
 
 @app.get("/", response_class=HTMLResponse)
-def serve_ui():
-    index = os.path.join(FRONTEND_PATH, "index.html")
-    if not os.path.exists(index):
+async def serve_ui():
+    if not os.path.exists(INDEX_PATH):
         raise HTTPException(500, "index.html not found in /frontend")
-    with open(index, "r", encoding="utf-8") as f:
-        return f.read()
+    return FileResponse(INDEX_PATH, media_type="text/html")
 
 # ============================================================
 # GLOBAL JMETER MANAGER
@@ -62,29 +90,29 @@ TEST_STATUS_FILE = "/tmp/test_status"
 # AWS ENDPOINTS
 # ============================================================
 @app.get("/aws/regions")
-def api_regions():
-    return list_regions()
+async def api_regions():
+    return await list_regions.aio()
 
 @app.get("/aws/instance-types")
-def api_instance_types(region: str = Query(...)):
-    return list_instance_types(region)
+async def api_instance_types(region: str = Query(...)):
+    return await list_instance_types.aio(region)
 
 @app.get("/aws/instance-info")
-def api_instance_info(region: str, instance_type: str):
-    info = get_instance_info(region, instance_type)
+async def api_instance_info(region: str, instance_type: str):
+    info = await get_instance_info.aio(region, instance_type)
     if not info:
         raise HTTPException(404, "Instance type not found")
     return info
 
 @app.get("/aws/os-family")
-def api_os_family(region: str, ami_id: str):
-    return {"family": detect_os_family(region, ami_id)}
+async def api_os_family(region: str, ami_id: str):
+    return {"family": await detect_os_family_aio(region, ami_id)}
 
 # ============================================================
 # EKS CLUSTER CREATION — NO AMI REQUIRED
 # ============================================================
 @app.post("/eks/create")
-def api_eks_create(data: dict):
+async def api_eks_create(data: dict):
     region = data.get("AWS_REGION")
     node_type = data.get("NODE_INSTANCE_TYPE")
 
@@ -92,8 +120,6 @@ def api_eks_create(data: dict):
         raise HTTPException(400, "AWS_REGION and NODE_INSTANCE_TYPE are required")
 
     try:
-        manager.create_cluster(region=region, node_type=node_type)
-
         ctx = {
             "TESTPLAN_REPO": data.get("TESTPLAN_REPO"),
             "MAX_SHARDS": int(data.get("MAX_SHARDS", 1)),
@@ -104,13 +130,20 @@ def api_eks_create(data: dict):
             "HTTP_PORT": 8080,
             "JMETER_RMI_PORT": 50000,
         }
+    except ValueError as e:
+        raise HTTPException(400, str(e))
 
-        manager.apply_jmeter_manifests(ctx)
-        return {"status": "Cluster creation started"}
+    # eksctl + manifests run in the background; poll /eks/status
+    try:
+        job = manager.start_cluster_creation(region=region, node_type=node_type, context=ctx)
+    except RuntimeError as e:
+        raise HTTPException(409, str(e))
 
-    except Exception as e:
-        LOG.exception("Cluster creation failed")
-        raise HTTPException(500, str(e))
+    return {"job_id": job["job_id"], "status": job["status"]}
+
+@app.get("/eks/status")
+async def api_eks_status():
+    return manager.get_cluster_creation_status()
 
 @app.post("/eks/delete")
 def api_delete():
@@ -175,7 +208,13 @@ def api_status():
 def api_results():
     try:
         path = manager.fetch_results("./results/results.jtl")
-        return FileResponse(path, filename=os.path.basename(path))
+        # Sent compressed as stored; browsers decode it and save the .jtl
+        return FileResponse(
+            path,
+            media_type="text/csv",
+            filename=os.path.basename(path)[: -len(".gz")],
+            headers={"Content-Encoding": "gzip"},
+        )
     except Exception as e:
         raise HTTPException(500, str(e))
 
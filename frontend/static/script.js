@@ -31,8 +31,8 @@ async function createCluster() {
         });
 
         if (!resp.ok) throw new Error(await resp.text());
-        setStatus("Cluster Ready - Deploying JMeter...", "green");
         alert("Cluster creation started.");
+        pollClusterStatus();
     } catch (err) {
         console.error("Cluster creation failed:", err);
         setStatus("Error creating cluster", "red");
@@ -40,6 +40,30 @@ async function createCluster() {
     }
 }
 
+// =======================================================
+// POLL CLUSTER CREATION JOB (eksctl runs 15-20 minutes)
+// =======================================================
+async function pollClusterStatus() {
+    try {
+        const job = await fetch("/eks/status").then(r => r.json());
+
+        if (job.status === "SUCCEEDED") {
+            setStatus("Cluster Ready", "green");
+            return;
+        }
+        if (job.status === "FAILED") {
+            console.error("Cluster creation failed:", job.error);
+            setStatus("Error creating cluster", "red");
+            alert("Cluster creation failed! Check backend logs.");
+            return;
+        }
+        setStatus(`Creating cluster... ${job.progress || ""}`, "orange");
+    } catch (err) {
+        console.error("Failed polling cluster status:", err);
+    }
+    setTimeout(pollClusterStatus, 10000);
+}
+
 // =======================================================
 // LOAD REGIONS
 // =======================================================